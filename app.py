@@ -1,8 +1,23 @@
 from flask import Flask, render_template, request
+from flask_caching import Cache
 import search
 
 app = Flask(__name__, template_folder="templates")
 
+# Number of most relevant documents shown for a Vector Model search
+MAX_RESULTS = 50
+
+# Rendered search results, kept per worker process
+cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache'})
+
+
+@cache.memoize(timeout=300)
+def render_results(query, algorithm, database_version):
+    # The database version is part of the cache key, so results are recomputed as soon as the index changes
+    documents = search.get_documents()
+    results = search.search(query, documents, algorithm, k=MAX_RESULTS)
+    return render_template('results.html', query=query, algorithm=algorithm, results=results)
+
 
 @app.route('/', methods=['GET', 'POST'])
 def search_documents():
@@ -24,15 +39,12 @@ def search_documents():
         return render_template('index.html', error_message=error_message)
 
     try:
-        documents = search.get_documents()
-        results = search.search(query, documents, algorithm)
+        return render_results(query, algorithm, search.get_database_version())
     except Exception as e:
         # Handle any unexpected errors during search
         error_message = "An error occurred during search: " + str(e)
         return render_template('index.html', error_message=error_message)
 
-    return render_template('results.html', query=query, algorithm=algorithm, results=results)
-
 
 @app.route('/documents')
 def get_documents():
@@ -47,4 +59,5 @@ def get_documents():
 
 
 if __name__ == '__main__':
+    # Development server only; in production run `gunicorn app:app`, which reads gunicorn.conf.py
     app.run(debug=True, use_reloader=True)
@@ -0,0 +1,7 @@
+import multiprocessing
+
+# One worker per core, since searches are CPU-bound
+workers = multiprocessing.cpu_count()
+
+# Import the app, and with it the NLTK stemmers and stop words, once before forking the workers
+preload_app = True
@@ -1,14 +1,45 @@
+import functools
 import math
+import multiprocessing
+import os
 import sqlite3
+import ahocorasick
 import arabert
+import langdetect
 import nltk
-import textblob
+import numpy as np
+from collections import Counter
 from contextlib import closing
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+# Number of leading characters of a text used to detect its language
+_LANGUAGE_SAMPLE_LENGTH = 200
+
+# Make langdetect's probabilistic detection return the same language for the same text on every run
+langdetect.DetectorFactory.seed = 0
+
+# Language resources, built once instead of once per call or per token
+_EN_STEMMER = nltk.stem.PorterStemmer()
+_EN_STOPWORDS = frozenset(nltk.corpus.stopwords.words('english'))
+_AR_STEMMER = nltk.stem.snowball.SnowballStemmer(language='arabic')
+
+# Documents last read from the database, reused until the database files change
+_document_cache = {'version': None, 'documents': None}
+
+# Fitted TF-IDF model of the last corpus searched, rebuilt only when the corpus changes
+_vector_cache = {'documents': None, 'key': None, 'vectorizer': None, 'matrix': None, 'tokens': None,
+                 'term_counts': None, 'postings': None}
+
+
+@functools.lru_cache(maxsize=10_000)
+def _detect_language_sample(sample):
+    return langdetect.detect(sample)
 
 
 def detect_language(text):
     """
-    This function detects the language of the provided text using the TextBlob library.
+    This function detects the language of the provided text using the langdetect library. Only the beginning of the
+    text is examined, and results are memoized, so repeated detections of the same text are free.
 
     Args:
         text (str): The text whose language needs to be identified.
@@ -17,14 +48,14 @@ def detect_language(text):
         str: The ISO code of the detected language.
     """
 
-    # Create a TextBlob object from the input text
-    text_blob = textblob.TextBlob(text)
+    # The first characters are enough to tell the supported languages apart
+    return _detect_language_sample(text[:_LANGUAGE_SAMPLE_LENGTH])
 
-    # Use the TextBlob library's built-in language detection function
-    detected_language = text_blob.detect_language()
 
-    # Return the ISO code of the detected language
-    return detected_language.iso_code
+@functools.lru_cache(maxsize=100_000)
+def _stem_en(token):
+    # Natural text repeats a small vocabulary, so most tokens are stemmed only once
+    return _EN_STEMMER.stem(token)
 
 
 def preprocess_text(text, language):
@@ -46,309 +77,529 @@ def preprocess_text(text, language):
         # English text preprocessing steps:
         # 1. Tokenize the text into individual words
         tokens = nltk.word_tokenize(text)
-        # 2. Stem each word using Porter Stemmer
-        stemmed_tokens = [nltk.stem.PorterStemmer().stem(token) for token in tokens]
-        # 3. Remove stop words from the token list
-        filtered_tokens = [token for token in stemmed_tokens if token not in nltk.corpus.stopwords.words('english')]
-        # 4. Join the filtered tokens back into a single string
+        # 2. Remove stop words, which are listed in lowercase, and stem the remaining words using Porter Stemmer
+        filtered_tokens = [_stem_en(token) for token in tokens if token.lower() not in _EN_STOPWORDS]
+        # 3. Join the filtered tokens back into a single string
         preprocessed_text = ' '.join(filtered_tokens)
     elif language == 'ar':
         # Arabic text preprocessing steps:
         # 1. Tokenize the text into individual words
         tokens = nltk.word_tokenize(text)
-        # 2. Stem each word using Snowball Stemmer for Arabic
-        stemmer = nltk.stem.snowball.SnowballStemmer(language='arabic')
-        stemmed_tokens = [stemmer.stem(token) for token in tokens]
-        # 3. Filter out stop words using arabert's is_stop_word function
-        filtered_tokens = [token for token in stemmed_tokens if not arabert.is_stop_word(token)]
-        # 4. Join the filtered tokens back into a single string
+        # 2. Filter out stop words using arabert's is_stop_word function and stem the remaining words using Snowball
+        # Stemmer for Arabic
+        filtered_tokens = [_AR_STEMMER.stem(token) for token in tokens if not arabert.is_stop_word(token)]
+        # 3. Join the filtered tokens back into a single string
         preprocessed_text = ' '.join(filtered_tokens)
 
     return preprocessed_text
 
 
-def index_document(filename, text, language):
+def ensure_schema(connection):
     """
-    This function indexes a document into the database with the provided filename, text, and language.
+    This function creates the documents table and its indexes if they do not exist yet, and adds the tokens column
+    to databases created before it was introduced.
 
     Args:
-        filename (str): The filename of the document.
-        text (str): The text content of the document.
-        language (str): The language of the document, either 'en' for English or 'ar' for Arabic.
+        connection (sqlite3.Connection): An open connection to the index database.
+
+    Returns:
+        None
+    """
+
+    connection.execute('CREATE TABLE IF NOT EXISTS documents ('
+                       'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                       'filename TEXT NOT NULL, '
+                       'text TEXT NOT NULL, '
+                       'language TEXT NOT NULL, '
+                       'tokens TEXT)')
+
+    # Older databases lack the tokens column; their rows keep NULL tokens until re-indexed
+    columns = [row[1] for row in connection.execute('PRAGMA table_info(documents)')]
+    if 'tokens' not in columns:
+        connection.execute('ALTER TABLE documents ADD COLUMN tokens TEXT')
+
+    connection.execute('CREATE INDEX IF NOT EXISTS idx_documents_language ON documents(language)')
+
+
+def index_documents(documents):
+    """
+    This function indexes a batch of documents into the database over a single connection and transaction. The text
+    of each document is preprocessed once here and its tokens are stored alongside it, so searches never have to
+    re-tokenize it.
+
+    Args:
+        documents (iterable): (filename, text, language) tuples of the documents to be indexed, where language is
+        either 'en' for English or 'ar' for Arabic.
 
     Returns:
         None
     """
 
     try:
+        # Preprocess each text once so its tokens can be cached with the document. This is done before connecting,
+        # so the slow stemming never runs while the transaction holds the database write lock
+        rows = [(filename, text, language, preprocess_text(text, language)) for filename, text, language in documents]
+
         # Connect to the SQLite database using a context manager for automatic closing
         with closing(sqlite3.connect('index.db')) as connection:
-            # Create a cursor object for executing database queries
-            cursor = connection.cursor()
+            # Write-ahead logging lets readers keep searching while documents are being indexed, and only syncs on
+            # checkpoints instead of on every commit
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
 
-            # Execute the SQL statement to insert the document into the database
-            cursor.execute('INSERT INTO documents (filename, text, language) VALUES (?, ?, ?)',
-                           (filename, text, language))
+            ensure_schema(connection)
 
-            # Commit changes to the database
-            connection.commit()
+            # Insert all documents with one prepared statement and commit them together
+            with connection:
+                connection.executemany('INSERT INTO documents (filename, text, language, tokens) VALUES (?, ?, ?, ?)',
+                                       rows)
     except Exception as e:
         # Print an error message if any exception occurs during indexing
-        print(f"Error indexing document: {e}")
-    finally:
-        # Ensure the connection is closed even if an exception occurs
-        if connection:
-            connection.close()
+        print(f"Error indexing documents: {e}")
+
+
+def index_document(filename, text, language):
+    """
+    This function indexes a document into the database with the provided filename, text, and language. Use
+    index_documents to index several documents at once.
+
+    Args:
+        filename (str): The filename of the document.
+        text (str): The text content of the document.
+        language (str): The language of the document, either 'en' for English or 'ar' for Arabic.
+
+    Returns:
+        None
+    """
+
+    index_documents([(filename, text, language)])
+
+
+def get_database_version():
+    """
+    This function returns a value that changes whenever the database is modified, for keying caches of its contents.
+
+    Returns:
+        tuple: The modification time and size of the database file and of its write-ahead log, or None for a missing
+        file.
+    """
+
+    # With WAL journaling, new rows land in index.db-wal until they are checkpointed into index.db, so both files
+    # have to be watched
+    version = []
+    for path in ('index.db', 'index.db-wal'):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            version.append(None)
+        else:
+            version.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(version)
 
 
 def get_documents():
     """
-    This function retrieves all indexed documents from the database.
+    This function retrieves all indexed documents from the database. The documents are kept in memory and only read
+    again once the database files have been modified.
 
     Returns:
-        list: A list of dictionaries containing document information.
+        list: A list of sqlite3.Row objects with the id, filename, text, language and tokens of each document.
     """
 
-    # Connect to the SQLite database
-    connection = sqlite3.connect('index.db')
+    version = get_database_version()
+    if _document_cache['version'] == version:
+        return _document_cache['documents']
 
-    # Create a cursor object for executing database queries
-    cursor = connection.cursor()
+    # Connect to the SQLite database using a context manager for automatic closing, even if a query fails
+    with closing(sqlite3.connect('index.db')) as connection:
+        ensure_schema(connection)
 
-    # Execute the SQL statement to retrieve all documents from the database
-    cursor.execute('SELECT * FROM documents')
+        # Return rows that can be indexed by column name, like the dictionaries the search functions expect
+        connection.row_factory = sqlite3.Row
 
-    # Fetch all results as a list of dictionaries
-    documents = cursor.fetchall()
+        # Retrieve all documents, including their cached tokens, from the database
+        documents = connection.execute('SELECT id, filename, text, language, tokens FROM documents').fetchall()
 
-    # Close the database connection
-    connection.close()
+    # Key the cache on the version seen before reading, so a write made during the read triggers another one
+    _document_cache.update(version=version, documents=documents)
 
     return documents
 
 
-def create_document_vectors(documents):
+def _preprocess_document(document):
+    # Runs in a worker process, so it receives plain (text, language) tuples rather than database rows
+    text, language = document
+    return preprocess_text(text, language)
+
+
+def get_document_tokens(documents):
     """
-    This function creates document vectors for each indexed document, representing the term frequencies of each word.
+    This function returns the preprocessed tokens of each document, as cached at indexing time. Documents indexed
+    before the tokens column existed are preprocessed on the fly, in parallel when there are several of them, and
+    their tokens are stored when the database allows it, so an English or Arabic document is normally preprocessed
+    only once. Documents in other languages have no terms.
 
     Args:
         documents (list): A list of dictionaries containing document information.
 
     Returns:
-        dict: A dictionary where keys are filenames and values are dictionaries mapping terms to their frequencies.
+        list: The space-joined preprocessed tokens of each document, in the order of the documents list.
     """
 
-    document_vectors = {}
-    for doc in documents:
-        # Preprocess the document text based on its language
-        preprocessed_text = preprocess_text(doc['text'], doc['language'])
+    tokens = [doc['tokens'] for doc in documents]
 
-        # Tokenize the preprocessed text into individual terms
-        tokens = preprocessed_text.split()
+    missing = []
+    for i, doc_tokens in enumerate(tokens):
+        if doc_tokens is None:
+            if documents[i]['language'] in ('en', 'ar'):
+                missing.append(i)
+            else:
+                # preprocess_text has no pipeline for other languages, so these documents contribute no terms
+                tokens[i] = ''
+
+    if len(missing) > 1:
+        # Stemming is CPU-bound pure Python work, so spread it over one process per core
+        with multiprocessing.Pool() as pool:
+            preprocessed = pool.map(_preprocess_document,
+                                    [(documents[i]['text'], documents[i]['language']) for i in missing])
+        for i, doc_tokens in zip(missing, preprocessed):
+            tokens[i] = doc_tokens
+    elif missing:
+        tokens[missing[0]] = preprocess_text(documents[missing[0]]['text'], documents[missing[0]]['language'])
+
+    if missing:
+        # Store the computed tokens, so later corpus rebuilds and other processes do not preprocess them again. This
+        # is only an optimization, so a busy or read-only database must not fail the search
+        try:
+            with closing(sqlite3.connect('index.db')) as connection:
+                with connection:
+                    connection.executemany('UPDATE documents SET tokens = ? WHERE id = ?',
+                                           [(tokens[i], documents[i]['id']) for i in missing])
+        except sqlite3.Error as e:
+            print(f"Error storing document tokens: {e}")
+
+    return tokens
+
+
+def create_inverted_index(vectorizer, matrix):
+    """
+    This function creates an inverted index mapping each term to the documents containing it, from the nonzero
+    entries of the TF-IDF matrix, so the documents do not have to be split again.
 
-        # Initialize a dictionary to store term frequencies
-        term_counts = {}
+    Args:
+        vectorizer (TfidfVectorizer): The vectorizer fitted on the documents.
+        matrix (scipy.sparse matrix): The N x V TF-IDF matrix of the documents.
 
-        # Count the frequency of each term in the document
-        for term in tokens:
-            if term in term_counts:
-                term_counts[term] += 1
-            else:
-                term_counts[term] = 1
+    Returns:
+        dict: A dictionary mapping each term to the set of positions of the documents containing it.
+    """
+
+    # In column-major order, the rows of each term's nonzero weights are stored contiguously
+    columns = matrix.tocsc()
+    terms = vectorizer.get_feature_names_out()
+
+    return {term: set(columns.indices[columns.indptr[j]:columns.indptr[j + 1]].tolist())
+            for j, term in enumerate(terms)}
+
+
+def get_term_counts(documents):
+    """
+    This function returns the term counts of the indexed documents. They are counted from the document tokens on
+    first use and kept until the corpus changes.
+
+    Args:
+        documents (list): A list of dictionaries containing document information.
+
+    Returns:
+        list: A Counter mapping each term to its number of occurrences for each document, in the order of the
+        documents list.
+    """
 
-        # Store the term frequency dictionary for the current document
-        document_vectors[doc['filename']] = term_counts
+    create_document_vectors(documents)
+    if _vector_cache['term_counts'] is None:
+        _vector_cache['term_counts'] = [Counter(doc_tokens.split()) for doc_tokens in _vector_cache['tokens']]
 
-    return document_vectors
+    return _vector_cache['term_counts']
 
 
-def calculate_tf(term, document):
+def get_inverted_index(documents):
+    """
+    This function returns the inverted index of the indexed documents. It is built from their vectors on first use
+    and kept until the corpus changes.
+
+    Args:
+        documents (list): A list of dictionaries containing document information.
+
+    Returns:
+        dict: A dictionary mapping each term to the set of positions of the documents containing it.
+    """
+
+    vectorizer, matrix = create_document_vectors(documents)
+    if _vector_cache['postings'] is None:
+        _vector_cache['postings'] = create_inverted_index(vectorizer, matrix)
+
+    return _vector_cache['postings']
+
+
+def create_document_vectors(documents):
+    """
+    This function creates the TF-IDF document vectors of the indexed documents. The vectorizer is fitted once per
+    corpus and reused by later searches over the same documents, which must not be modified in place.
+
+    Args:
+        documents (list): A list of dictionaries containing document information.
+
+    Returns: tuple: The fitted TfidfVectorizer and a sparse CSR matrix with one L2-normalized TF-IDF row per
+    document, in the order of the documents list.
+    """
+
+    # Work on a snapshot and publish it in one update, so a concurrent search never pairs one corpus's documents list
+    # with another corpus's matrix
+    cache = _vector_cache.copy()
+
+    # get_documents hands out the same list until the database changes, which spares rebuilding the corpus key. The
+    # length check catches a list that was grown or shrunk in place since it was vectorized
+    if cache['documents'] is documents and cache['matrix'].shape[0] == len(documents):
+        return cache['vectorizer'], cache['matrix']
+
+    corpus_key = tuple((doc['filename'], doc['tokens'], doc['language']) for doc in documents)
+    if cache['key'] != corpus_key:
+        tokens = get_document_tokens(documents)
+
+        # The vectorizer only has to split the cached tokens of each document. Single precision is plenty for
+        # ranking and halves the memory the scoring product has to stream through
+        vectorizer = TfidfVectorizer(analyzer=str.split, norm='l2', dtype=np.float32)
+        matrix = vectorizer.fit_transform(tokens)
+
+        # Key the model on the tokens it was fitted on. Once computed tokens are stored, the reloaded documents carry
+        # the same tokens and match this key, so the identical corpus is not fitted a second time
+        corpus_key = tuple((doc['filename'], doc_tokens, doc['language'])
+                           for doc, doc_tokens in zip(documents, tokens))
+
+        # The term counts and the inverted index are only built when they are first asked for
+        cache = dict(documents=documents, key=corpus_key, vectorizer=vectorizer, matrix=matrix, tokens=tokens,
+                     term_counts=None, postings=None)
+    else:
+        cache['documents'] = documents
+
+    _vector_cache.update(cache)
+
+    return cache['vectorizer'], cache['matrix']
+
+
+def calculate_tf(term, term_counts):
     """
     Calculates the term frequency (tf) for a term in a document.
 
     Args:
         term (str): The term to be analyzed.
-        document (str): The document text.
+        term_counts (Counter): The term counts of the document, as returned by get_term_counts.
 
     Returns:
         int: The frequency of the term in the document.
     """
-    tf = 0
-    for token in document.split():
-        if token == term:
-            tf += 1
-    return tf
+    return term_counts[term]
 
 
-def calculate_idf(term, documents):
+def calculate_idf(term, postings, num_documents):
     """
     Calculates the inverse document frequency (idf) for a term across all documents.
 
     Args:
         term (str): The term to be analyzed.
-        documents (list): A list of document strings.
+        postings (dict): The inverted index of the documents, mapping each term to the documents containing it.
+        num_documents (int): The number of documents.
 
     Returns:
         float: The idf score for the term.
     """
-    num_docs_containing_term = 0
-    for document in documents:
-        if term in document:
-            num_docs_containing_term += 1
+    num_docs_containing_term = len(postings.get(term, ()))
 
     if num_docs_containing_term == 0:
-        idf = math.log(len(documents) + 1)
+        idf = math.log(num_documents + 1)
     else:
-        idf = math.log(len(documents) / num_docs_containing_term)
+        idf = math.log(num_documents / num_docs_containing_term)
     return idf
 
 
-def calculate_tf_idf(term, document, documents):
+def calculate_tf_idf(term, term_counts, postings, num_documents):
     """
     Calculates the TF-IDF weight for a term in a document.
 
     Args:
         term (str): The term to be analyzed.
-        document (str): The document text.
-        documents (list): A list of document strings.
+        term_counts (Counter): The term counts of the document, as returned by get_term_counts.
+        postings (dict): The inverted index of the documents, mapping each term to the documents containing it.
+        num_documents (int): The number of documents.
 
     Returns:
         float: The tf-idf weight for the term.
     """
-    tf = calculate_tf(term, document)
-    idf = calculate_idf(term, documents)
+    tf = calculate_tf(term, term_counts)
+    idf = calculate_idf(term, postings, num_documents)
     return tf * idf
 
 
-def calculate_document_length(document):
+def calculate_document_length(term_counts):
     """
     Calculates the document length (number of terms) in a document.
 
     Args:
-        document (str): The document text.
+        term_counts (Counter): The term counts of the document, as returned by get_term_counts.
 
     Returns:
         int: The length of the document.
     """
-    return len(document.split())
+    return sum(term_counts.values())
 
 
-def calculate_cosine_similarities(query_vector, document_vectors):
+def calculate_cosine_similarities(query_vector, document_matrix):
     """
     Calculates the cosine similarity between a query vector and all document vectors, representing the relevance of
-    each document to the query.
+    each document to the query. Both sides are L2-normalized, so the similarities reduce to a single sparse
+    matrix-vector product.
 
-    Args: query_vector (dict): A dictionary mapping terms to their TF-IDF weights in the query. document_vectors (
-    dict): A dictionary where keys are filenames and values are dictionaries mapping terms to their TF-IDF weights in
-    each document.
+    Args: query_vector (scipy.sparse matrix): The 1 x V TF-IDF vector of the query. document_matrix (
+    scipy.sparse matrix): The N x V TF-IDF matrix of the documents.
 
-    Returns: dict: A dictionary where keys are filenames and values are cosine similarity scores between the query
-    and each document.
+    Returns: numpy.ndarray: The cosine similarity scores between the query and each document, in document order.
     """
 
-    cosine_similarities = {}
-    for filename, doc_vector in document_vectors.items():
-        doc_terms = doc_vector.keys()
-        doc_weights = doc_vector.values()
-
-        # Calculating the dot product
-        dot_product = sum(query_vector.get(term, 0) * doc_vector.get(term, 0) for term in doc_terms)
+    # Multiplying the CSR matrix by a dense vector runs scipy's compiled row-wise kernel and yields the score array
+    # directly, without building and densifying an intermediate sparse product
+    return document_matrix @ query_vector.toarray().ravel().astype(np.float32, copy=False)
 
-        # Calculating the norms
-        norm_query = sum(weight ** 2 for weight in query_vector.values()) ** 0.5
-        norm_document = sum(weight ** 2 for weight in doc_weights) ** 0.5
-
-        if norm_query > 0 and norm_document > 0:
-            cosine_similarities[filename] = dot_product / (norm_query * norm_document)
-        else:
-            cosine_similarities[filename] = 0.0
 
-    return cosine_similarities
-
-
-def rank_documents(documents, scores):
+def rank_documents(documents, scores, k=None):
     """
     This function ranks documents based on their cosine similarity scores to the query, from most relevant to least
     relevant.
 
-    Args: documents (list): A list of dictionaries containing document information. scores (dict): A dictionary where
-    keys are filenames and values are cosine similarity scores between the query and each document.
+    Args: documents (list): A list of dictionaries containing document information. scores (numpy.ndarray): The
+    cosine similarity scores between the query and each document, in document order. k (int, optional): The number
+    of most relevant documents to return, or None to rank all documents.
 
     Returns:
         list: A list of dictionaries containing document information sorted by their relevance to the query.
     """
 
-    # Sort documents based on their scores in descending order (most relevant first)
-    ranked_documents = sorted(documents, key=lambda doc: scores[doc['filename']], reverse=True)
+    if k is None or k >= len(scores):
+        # Sort documents based on their scores in descending order (most relevant first), keeping ties in corpus order
+        order = np.argsort(-scores, kind='stable')
+    elif k <= 0:
+        order = []
+    else:
+        # Find the k-th best score in linear time, take every document scoring above it, and fill the remaining
+        # slots with the first documents tied at it in corpus order, as the full stable sort would
+        kth_score = np.partition(scores, len(scores) - k)[len(scores) - k]
+        above = np.flatnonzero(scores > kth_score)
+        tied = np.flatnonzero(scores == kth_score)[:k - len(above)]
+        top = np.concatenate((above, tied))
+
+        # Only the k selected documents are sorted; the stable sort keeps the tied ones last and in corpus order
+        order = top[np.argsort(-scores[top], kind='stable')]
+
+    ranked_documents = [documents[i] for i in order]
 
     return ranked_documents
 
 
-def is_relevant_bm(query, document):
+def create_query_automaton(terms):
+    """
+    This function builds an Aho-Corasick automaton over the query terms, so that every term occurrence in a document
+    can be found in a single pass over its text.
+
+    Args:
+        terms (list): The terms of the search query.
+
+    Returns:
+        ahocorasick.Automaton: The automaton, whose matches report the matched term.
+    """
+
+    automaton = ahocorasick.Automaton()
+    for term in terms:
+        automaton.add_word(term, term)
+
+    # An automaton without words cannot be finalized or searched
+    if len(automaton):
+        automaton.make_automaton()
+
+    return automaton
+
+
+def is_relevant_bm(terms, automaton, document):
     """
     This function checks if a document is relevant to a query using the Boolean Model (BM) search logic.
 
     Args:
-        query (str): The search query.
+        terms (list): The distinct terms of the search query, the one to check first at the front.
+        automaton (ahocorasick.Automaton): The automaton built over the query terms.
         document (dict): A dictionary containing document text with key 'text'.
 
     Returns:
         bool: True if the document is relevant to the query, False otherwise.
     """
-    terms = query.split()
-    return all(term in document['text'] for term in terms)
+    if not terms:
+        return True
+
+    # Reject documents lacking the first term with one substring search before the full scan
+    if terms[0] not in document['text']:
+        return False
+
+    # The first term is known to be present, so a single-term query needs no automaton scan at all
+    remaining_terms = set(terms[1:])
+    if not remaining_terms:
+        return True
+
+    # Stop scanning as soon as every term has been seen instead of running through the rest of the text
+    for _, term in automaton.iter(document['text']):
+        remaining_terms.discard(term)
+        if not remaining_terms:
+            return True
 
+    return False
 
-def is_relevant_ebm(query, document):
+
+def is_relevant_ebm(automaton, document):
     """
     This function checks if a document is relevant to a query using the Extended Boolean Model (EBM) search logic.
 
     Args:
-        query (str): The search query.
+        automaton (ahocorasick.Automaton): The automaton built over the query terms.
         document (dict): A dictionary containing document text with key 'text'.
 
     Returns:
         bool: True if the document is relevant to the query, False otherwise.
     """
-    terms = query.split()
-    return any(term in document['text'] for term in terms)
+    if not len(automaton):
+        return False
 
+    # Stop at the first occurrence of any term instead of collecting all of them
+    return next(automaton.iter(document['text']), None) is not None
 
-def create_query_vector(query):
+
+def create_query_vector(query, vectorizer):
     """
-    This function creates a vector representation of the query by counting the frequency of each term after
-    preprocessing.
+    This function creates the TF-IDF vector representation of the query after preprocessing.
 
     Args:
         query (str): The search query.
+        vectorizer (TfidfVectorizer): The vectorizer fitted on the documents.
 
     Returns:
-        dict: A dictionary mapping each term in the query to its frequency.
+        scipy.sparse matrix: The 1 x V L2-normalized TF-IDF vector of the query.
     """
 
     # Preprocess the query text for English language
     preprocessed_query = preprocess_text(query, 'en')
 
-    # Tokenize the preprocessed query into individual terms
-    tokens = preprocessed_query.split()
-
-    # Initialize a dictionary to store term frequencies
-    term_counts = {}
-
-    # Count the frequency of each term in the query
-    for term in tokens:
-        if term in term_counts:
-            term_counts[term] += 1
-        else:
-            term_counts[term] = 1
-
-    # Create the query vector based on the term frequencies
-    query_vector = term_counts
+    # Project the query onto the vocabulary of the documents
+    query_vector = vectorizer.transform([preprocessed_query])
 
     return query_vector
 
 
-def search(query, documents, algorithm):
+def search(query, documents, algorithm, k=None):
     """
     This function searches the indexed documents for those relevant to the provided query using the specified search
     algorithm.
@@ -357,6 +608,7 @@ def search(query, documents, algorithm):
         query (str): The search query.
         documents (list): A list of dictionaries containing document information.
         algorithm (str): The search algorithm to be used (BM, EBM, or VM).
+        k (int, optional): The number of most relevant documents the VM returns, or None to rank all documents.
 
     Returns: list: A list of dictionaries containing information about relevant documents, or None if the algorithm
     is invalid.
@@ -364,33 +616,37 @@ def search(query, documents, algorithm):
 
     if algorithm == "BM":
         # Implement Boolean Model search logic
-        # Iterate through documents and check for presence of all query terms
-        relevant_docs = []
-        for document in documents:
-            if is_relevant_bm(query, document):
-                relevant_docs.append(document)
-        return relevant_docs
+        # Scan each document once for all query terms and check for presence of all of them. The longest term is
+        # checked first, a length heuristic for the term most likely to be missing, as corpus frequencies of raw
+        # substrings are not available
+        terms = sorted(set(query.split()), key=len, reverse=True)
+        automaton = create_query_automaton(terms)
+        return [document for document in documents if is_relevant_bm(terms, automaton, document)]
 
     elif algorithm == "EBM":
         # Implement Extended Boolean Model search logic
-        # Iterate through documents and check for presence of at least one query term
+        # Scan each document once for all query terms and check for presence of at least one of them
+        automaton = create_query_automaton(query.split())
         relevant_docs = []
         for document in documents:
-            if is_relevant_ebm(query, document):
+            if is_relevant_ebm(automaton, document):
                 relevant_docs.append(document)
         return relevant_docs
 
     elif algorithm == "VM":
         # Implement Vector Model search logic
+        if not documents:
+            return []
+
         # Create document vectors and query vector
-        document_vectors = create_document_vectors(documents)
-        query_vector = create_query_vector(query)
+        vectorizer, document_matrix = create_document_vectors(documents)
+        query_vector = create_query_vector(query, vectorizer)
 
         # Calculate cosine similarities between query and each document
-        scores = calculate_cosine_similarities(query_vector, document_vectors)
+        scores = calculate_cosine_similarities(query_vector, document_matrix)
 
         # Rank documents based on their cosine similarities
-        ranked_documents = rank_documents(documents, scores)
+        ranked_documents = rank_documents(documents, scores, k)
 
         return ranked_documents
 